@@ -13,9 +13,11 @@ The "Glue":
 - This is Dependency Injection (DI)
 """
 
-from datetime import datetime
-from pydantic import BaseModel
+from datetime import date
+from functools import lru_cache
+from dataclasses import dataclass
 from sqlmodel import Session, select
+from sqlalchemy import bindparam
 from pydantic_ai import Agent, RunContext
 from dotenv import load_dotenv
 
@@ -28,21 +30,25 @@ from app.models import Order, Customer, Product, OrderStatus, RefundTicket, Tick
 
 # For Vector Search
 import os
+import time
+from collections import OrderedDict
+import numpy as np
 from google import genai
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import SearchParams, QuantizationSearchParams
 
 # The Context - Dependency Injection
-class SupportDeps(BaseModel):
+@dataclass(slots=True)
+class SupportDeps:
     """
     This class holds the "Context" that the agent needs to function.
     FastAPI will create this and pass it to the agent every time it is called.
     This is a container. Notice DB is not initialized here. It is passed in runtime
+    A plain dataclass (not a Pydantic model): there is nothing to validate, so we skip that cost per request
     """
     user_id: int # Who is the agent speaking to?
     db: Session # Database connection
-
-    class Config:
-        arbitrary_types_allowed = True # Allow Session to be used as a type
+    customer: Customer | None = None # Already loaded during auth, saves a query in get_customer_profile
 
 
 # Agent Definition
@@ -53,12 +59,56 @@ agent = Agent(
         "You are a helpful customer support assistant from 'ShopSmart'. "
         "You have access to the customer's order history and product catalog. "
         "Always be polite and professional. "
-        "Use the provided tools to lookup information before answering the customer. "
-        "Today's date is" + datetime.now().strftime("%Y-%m-%d")
+        "Use the provided tools to lookup information before answering the customer."
     )
 )
 
 
+@lru_cache(maxsize=1)
+def _today_str(day_ordinal: int) -> str:
+    # Keyed by the day number, so the string is only rebuilt when the date changes
+    return date.fromordinal(day_ordinal).strftime("%Y-%m-%d")
+
+
+@agent.system_prompt
+def current_date() -> str:
+    """
+    Added to the prompt on every run (not once at import),
+    so a long-running server doesn't keep telling the LLM the day it started.
+    """
+    return f"Today's date is {_today_str(date.today().toordinal())}."
+
+
+# Reusable Queries
+# Built once at import with bind parameters (:uid, :order_id, ...) instead of
+# rebuilding the select() expression on every tool call. Values are passed via params=.
+
+# A customer's 5 latest orders, with the product name
+_RECENT_ORDERS = (
+    select(Order, Product)
+    .join(Product, Product.id == Order.product_id)
+    .where(Order.customer_id == bindparam("uid"))
+    .order_by(Order.order_date.desc())
+    .limit(5)
+)
+
+# One order, only if it belongs to the customer
+_ORDER_DETAILS = (
+    select(Order, Product)
+    .join(Product, Product.id == Order.product_id)
+    .where(Order.id == bindparam("order_id"), Order.customer_id == bindparam("uid"))
+)
+
+# A customer's refund tickets, newest first
+_REFUNDS = (
+    select(RefundTicket)
+    .where(RefundTicket.customer_id == bindparam("uid"))
+    .order_by(RefundTicket.created_at.desc())
+)
+_REFUNDS_FOR_ORDERS = _REFUNDS.where(RefundTicket.order_id.in_(bindparam("order_ids", expanding=True)))
+_LATEST_REFUND_FOR_ORDER = _REFUNDS.where(RefundTicket.order_id == bindparam("order_id")).limit(1)
+
+
 # Tools Definition
 
 @agent.tool
@@ -72,8 +122,8 @@ def get_customer_profile(ctx: RunContext[SupportDeps]) -> str:
     session = ctx.deps.db
     user_id = ctx.deps.user_id
 
-    # 2. Query the database for the user
-    customer = session.get(Customer, user_id)
+    # 2. Use the customer loaded during auth, or query the database for the user
+    customer = ctx.deps.customer or session.get(Customer, user_id)
 
     if not customer:
         return "Error: Customer not found"
@@ -90,19 +140,18 @@ def list_recent_orders(ctx: RunContext[SupportDeps]) -> str:
     session = ctx.deps.db
     user_id = ctx.deps.user_id
 
-    # Select orders for THIS customer
-    statement = select(Order).where(Order.customer_id == user_id).order_by(Order.order_date.desc()).limit(5)
-    orders = session.exec(statement).all()
+    # Select orders for THIS customer, joined with the product so the LLM
+    # gets item names without having to call get_order_details per order
+    rows = session.exec(_RECENT_ORDERS, params={"uid": user_id}).all()
 
-    if not orders:
+    if not rows:
         return "No recent orders found"
 
     # Format the output for the LLM (It reads text better than raw JSON sometimes)
-    report = []
-    for order in orders:
-        report.append(f"Order ID: {order.id}, Date: {order.order_date}, Total: {order.total_price}, Status: {order.status}")
-    
-    return "\n".join(report)
+    return "\n".join(
+        f"Order ID: {order.id}, Product: {product.name}, Date: {order.order_date}, Total: {order.total_price}, Status: {order.status}"
+        for order, product in rows
+    )
 
 
 @agent.tool
@@ -114,45 +163,56 @@ def get_order_details(ctx: RunContext[SupportDeps], order_id: int) -> str:
     session = ctx.deps.db
 
     # Security Check: We must ensure the order belongs to the current user
-    # This prevents User A from looking up User B's orders
-    order = session.get(Order, order_id)
+    # This prevents User A from looking up User B's orders.
+    # Filtering on customer_id in the same query makes the check free (one round-trip).
+    row = session.exec(_ORDER_DETAILS, params={"order_id": order_id, "uid": ctx.deps.user_id}).first()
 
-    if not order:
+    if not row:
+        # Either it doesn't exist or it isn't theirs - don't reveal which
         return "Error: Order not found"
 
-    if order.customer_id != ctx.deps.user_id:
-        return "Security Alert: You do not have access to this order"
-
-    return f"Order {order.id} details: Status: {order.status}, Items Qty: {order.quantity}, Total: {order.total_price}, Order Date: {order.order_date}"
+    order, product = row
+    return f"Order {order.id} details: Product: {product.name}, Status: {order.status}, Items Qty: {order.quantity}, Total: {order.total_price}, Order Date: {order.order_date}"
 
 
 
 @agent.tool
-def check_refund_status(ctx: RunContext[SupportDeps], order_id: int | None = None) -> str:
+def check_refund_status(ctx: RunContext[SupportDeps], order_ids: list[int] | None = None) -> str:
     """
     Check the status of refund requests.
-    - If order_id is provided, checks that specific order.
-    - If no order_id is provided, lists ALL pending refunds for the user.
+    - If order_ids is provided, checks those orders. Pass ALL the orders you need in one call
+      (e.g. [12, 15, 18]) rather than calling this tool once per order.
+    - If no order_ids are provided, lists ALL refunds for the user.
     """
     session = ctx.deps.db
     user_id = ctx.deps.user_id
     
-    query = select(RefundTicket).where(RefundTicket.customer_id == user_id)
-    
-    # If the user specified an order, filter by it
-    if order_id:
-        query = query.where(RefundTicket.order_id == order_id)
-        
-    tickets = session.exec(query).all()
+    # Newest first, so the database does the sorting. Each branch has a matching
+    # index on RefundTicket: (customer_id, created_at) for the full list,
+    # (customer_id, order_id, created_at) when filtering by order.
+    if not order_ids:
+        tickets = session.exec(_REFUNDS, params={"uid": user_id}).all()
+    elif len(order_ids) == 1:
+        # Only the latest ticket matters, so fetch just one row
+        tickets = session.exec(_LATEST_REFUND_FOR_ORDER, params={"uid": user_id, "order_id": order_ids[0]}).all()
+    else:
+        # Several orders: one IN query for all of them
+        tickets = session.exec(_REFUNDS_FOR_ORDERS, params={"uid": user_id, "order_ids": order_ids}).all()
     
     if not tickets:
         return "No active refund tickets found."
     
-    report = []
+    # Group tickets per order so the LLM can answer order by order
+    by_order: dict[int, list[RefundTicket]] = {}
     for t in tickets:
-        report.append(f"Ticket #{t.id} for Order {t.order_id}: Status = {t.status.value}")
-        
-    return "\n".join(report)
+        if order_ids and t.order_id in by_order:
+            continue # Specific orders asked for: keep only the latest ticket of each
+        by_order.setdefault(t.order_id, []).append(t)
+
+    return "\n".join(
+        f"Order {order_id}: " + "; ".join(f"Ticket #{t.id} Status = {t.status.value}" for t in order_tickets)
+        for order_id, order_tickets in by_order.items()
+    )
 
 
 # All above tools are GET operations
@@ -213,9 +273,12 @@ def request_refund(
 
 
 # --- VECTOR DB & AI CLIENT SETUP ---
-base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-qdrant_path = os.path.join(base_dir, "qdrant_data")
-qdrant = QdrantClient(path=qdrant_path)
+# Talk to a Qdrant server over gRPC (not the local-file mode) so several
+# uvicorn workers can share one index without fighting over a lock file.
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+# Async client: search_products awaits it, so it doesn't tie up a worker thread
+# while the agent runs its other tool calls for the same turn.
+qdrant = AsyncQdrantClient(url=QDRANT_URL, prefer_grpc=True, grpc_port=6334)
 
 # Initialize the new Client
 # Note: PydanticAI might handle the Agent chat, but WE handle the embeddings manually here.
@@ -223,8 +286,93 @@ ai_client = None
 if os.getenv("GOOGLE_API_KEY"):
     ai_client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 
+
+# --- EMBEDDING CACHE ---
+# Customers repeat the same phrasings a lot, so a cache hit skips the Gemini round-trip.
+# A plain LRU dict (functools.lru_cache can't cache the result of an async function).
+EMBED_CACHE_SIZE = 512
+
+_embed_cache: OrderedDict[str, tuple[float, ...]] = OrderedDict()
+_embed_stats = {"hits": 0, "misses": 0}
+
+
+async def _embed_query(query: str) -> tuple[float, ...]:
+    """
+    Embed a search query, remembering recent ones.
+    Returns a tuple so the cached value can't be mutated by callers.
+    """
+    if query in _embed_cache:
+        _embed_cache.move_to_end(query)
+        _embed_stats["hits"] += 1
+        return _embed_cache[query]
+
+    _embed_stats["misses"] += 1
+    response = await ai_client.aio.models.embed_content(
+        model="text-embedding-004",
+        contents=query
+    )
+    vector = tuple(response.embeddings[0].values)
+
+    _embed_cache[query] = vector
+    if len(_embed_cache) > EMBED_CACHE_SIZE:
+        _embed_cache.popitem(last=False) # Evict the least recently used query
+    return vector
+
+
+# --- SEMANTIC CACHE ---
+# Different phrasings of the same question ("warm jackets" vs "winter coats") land on
+# almost the same vector. If a new query is close enough to a recent one, reuse its
+# Qdrant hits instead of running another search.
+SEMANTIC_CACHE_SIZE = 128
+SEMANTIC_CACHE_THRESHOLD = 0.95 # Cosine similarity needed to count as "the same question"
+# Cached hits carry product payloads (prices, names), so they must not outlive a reindex for long
+SEMANTIC_CACHE_TTL = 300.0 # seconds
+
+# Rows of _cache_matrix are L2-normalized query vectors, so one matrix-vector product
+# (a single BLAS call) gives the cosine similarity against every cached query at once.
+# It is used as a ring buffer: once full, the oldest row is overwritten.
+_cache_matrix: np.ndarray | None = None # (SEMANTIC_CACHE_SIZE, dim) float32, allocated on first insert
+_cache_times = np.zeros(SEMANTIC_CACHE_SIZE, dtype=np.float64) # When each row was stored (time.monotonic)
+_cache_entries: list = [] # Qdrant hits, parallel to the filled rows of _cache_matrix
+_cache_next = 0 # Row to write next
+
+
+def _semantic_lookup(vq: np.ndarray):
+    """Return cached hits for a near-identical (normalized) query vector, or None on a miss."""
+    if not _cache_entries:
+        return None
+
+    n = len(_cache_entries)
+    sims = _cache_matrix[:n] @ vq
+    # Expired rows can never win, so a stale entry doesn't hide a fresh one behind it
+    expired = time.monotonic() - _cache_times[:n] >= SEMANTIC_CACHE_TTL
+    sims[expired] = -1
+    best = int(np.argmax(sims))
+    if sims[best] >= SEMANTIC_CACHE_THRESHOLD:
+        return _cache_entries[best]
+    return None
+
+
+def _semantic_store(vq: np.ndarray, hits) -> None:
+    global _cache_matrix, _cache_next
+    if not hits:
+        # Never cache "nothing found": the collection may just be empty mid-reindex
+        return
+
+    if _cache_matrix is None:
+        _cache_matrix = np.empty((SEMANTIC_CACHE_SIZE, vq.shape[0]), dtype=np.float32)
+
+    _cache_matrix[_cache_next] = vq
+    _cache_times[_cache_next] = time.monotonic()
+    if _cache_next < len(_cache_entries):
+        _cache_entries[_cache_next] = hits
+    else:
+        _cache_entries.append(hits)
+    _cache_next = (_cache_next + 1) % SEMANTIC_CACHE_SIZE
+
+
 @agent.tool
-def search_products(ctx: RunContext[SupportDeps], query: str) -> str:
+async def search_products(ctx: RunContext[SupportDeps], query: str) -> str:
     """
     Search for products based on concepts (Semantic Search).
     Use for: 'recommendations', 'winter clothes', 'gift ideas', or vague descriptions.
@@ -235,31 +383,45 @@ def search_products(ctx: RunContext[SupportDeps], query: str) -> str:
     print(f"🔍 Vector Search Query: {query}")
     
     try:
-        # 1. Convert Query to Vector (New SDK)
-        response = ai_client.models.embed_content(
-            model="text-embedding-004",
-            contents=query
-        )
-        user_vector = response.embeddings[0].values
+        # 1. Convert Query to Vector (cached; normalise so "Winter Coats " == "winter coats")
+        user_vector = list(await _embed_query(query.strip().lower()))
+        print(f"   Embedding cache: {_embed_stats} size={len(_embed_cache)}")
         
-        # 2. Search Qdrant
-        hits = qdrant.search(
-            collection_name="shop_products",
-            query_vector=user_vector,
-            limit=3
-        )
+        # Normalize once here so the cache only needs dot products
+        vq = np.asarray(user_vector, dtype=np.float32)
+        vq /= np.linalg.norm(vq)
+
+        # 2. Search Qdrant (unless a near-identical query was answered recently)
+        hits = _semantic_lookup(vq)
+        if hits is None:
+            hits = await qdrant.search(
+                collection_name="shop_products",
+                query_vector=user_vector,
+                limit=3,
+                # hnsw_ef = candidates explored per search. Higher = better recall, slower.
+                # 100 keeps recall near-exact for a catalog this size at a small latency cost.
+                # Scan the int8 vectors, fetch 2x the candidates, then rescore them with float32.
+                search_params=SearchParams(
+                    hnsw_ef=100,
+                    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+                )
+            )
+            _semantic_store(vq, hits)
+        else:
+            print("   Semantic cache hit")
         
         if not hits:
             return "No relevant products found."
         
-        # 3. Format Results
-        report = []
-        for hit in hits:
-            info = hit.payload
-            if hit.score > 0.4:
-                report.append(f"Product: {info['name']} (${info['price']}) - {info['description']}")
-        
-        return "\n".join(report) if report else "No relevant matches found."
+        # 3. Format Results (only confident matches)
+        relevant = [hit.payload for hit in hits if hit.score > 0.4]
+        if not relevant:
+            return "No relevant matches found."
+
+        return "\n".join(
+            f"Product: {info['name']} (${info['price']}) - {info['description']}"
+            for info in relevant
+        )
         
     except Exception as e:
         return f"Search Error: {str(e)}"
\ No newline at end of file
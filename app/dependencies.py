@@ -8,11 +8,18 @@ It verfies who the user is and sets up the database session for the request
 from fastapi import HTTPException, Header, Depends
 from sqlmodel import Session, select
 from typing import Annotated
+import time
 
 from app.utils.db import get_session
 from app.models import Customer
 from app.agent import SupportDeps
 
+# Recently seen customers, so every /chat message doesn't re-query the same user.
+# Changes to a customer (e.g. VIP status) show up once their entry expires.
+CUSTOMER_CACHE_TTL = 60.0 # seconds
+CUSTOMER_CACHE_SIZE = 1024
+_customer_cache: dict[int, tuple[float, Customer]] = {} # user_id -> (timestamp, customer)
+
 # 1. Simulate Authentication
 # In a real app, this would be a JWT token or something
 # For this project, we simply trust the user ID  header
@@ -24,10 +31,21 @@ async def get_current_user(
     if not user_id:
         raise HTTPException(status_code=401, detail="User ID is Missing")
 
+    cached = _customer_cache.get(user_id)
+    if cached and time.monotonic() - cached[0] < CUSTOMER_CACHE_TTL:
+        return cached[1]
+
     customer = session.get(Customer, user_id)
     if not customer:
         raise HTTPException(status_code=401, detail="Invalid User ID")
 
+    # Detach it from this session, so a commit later in the request (e.g. a refund)
+    # can't expire the cached copy's attributes
+    session.expunge(customer)
+
+    if len(_customer_cache) >= CUSTOMER_CACHE_SIZE:
+        _customer_cache.clear() # Simple bound; it refills with active users
+    _customer_cache[user_id] = (time.monotonic(), customer)
     return customer
 
 # 2. Build the Agent Dependencies
@@ -36,4 +54,4 @@ async def get_agent_deps(
     user: Customer = Depends(get_current_user),
     session: Session = Depends(get_session)
 ) -> SupportDeps:
-    return SupportDeps(user_id=user.id, db=session)
+    return SupportDeps(user_id=user.id, db=session, customer=user)
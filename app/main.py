@@ -23,6 +23,7 @@ from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 
+import time
 import uvicorn
 
 app = FastAPI(title="ShopSmart Customer Support Agent")
@@ -80,6 +81,22 @@ def health_check():
     return {"status": "ok"}
 
 
+# Built once at import rather than on every request
+_PENDING_TICKETS = select(RefundTicket).where(RefundTicket.status == TicketStatus.PENDING_APPROVAL)
+
+# --- ADMIN TICKETS CACHE ---
+# The dashboard polls /admin/tickets constantly. Serve repeats from memory for a
+# couple of seconds instead of re-running the query on every poll.
+# Decisions below clear it right away; tickets created by the agent show up once the TTL expires.
+PENDING_CACHE_TTL = 2.0 # seconds
+_pending_cache: tuple[float, list] | None = None # (timestamp, tickets)
+
+
+def _invalidate_pending_cache():
+    global _pending_cache
+    _pending_cache = None
+
+
 # Admin Request Model
 class AdminDecision(BaseModel):
     decision: str # "approve" or "reject"
@@ -118,6 +135,7 @@ def admin_review_refund(
 
         session.add(ticket)
         session.commit()
+        _invalidate_pending_cache()
 
         # --- NEW: Simulate Sending an Email ---
         print(f"📧 [MOCK EMAIL SENT] To User {ticket.customer_id}: 'Your refund for Order {ticket.order_id} is APPROVED.'")
@@ -128,6 +146,7 @@ def admin_review_refund(
         ticket.status = TicketStatus.REJECTED
         session.add(ticket)
         session.commit()
+        _invalidate_pending_cache()
         return {"status": "rejected", "message": f"Refund request for Order {ticket.order_id} denied"}
     else:
         raise HTTPException(status_code=400, detail="Invalid decision. Use 'approve' or 'reject'")
@@ -138,8 +157,13 @@ def list_pending_tickets(session: Session = Depends(get_session)):
     """
     Fetch all tickets that are waiting for approvals
     """
-    statement = select(RefundTicket).where(RefundTicket.status == TicketStatus.PENDING_APPROVAL)
-    tickets = session.exec(statement).all()
+    global _pending_cache
+    if _pending_cache and time.monotonic() - _pending_cache[0] < PENDING_CACHE_TTL:
+        return _pending_cache[1]
+
+    # Store plain dicts, not ORM objects, since the session closes after this request
+    tickets = [t.model_dump() for t in session.exec(_PENDING_TICKETS).all()]
+    _pending_cache = (time.monotonic(), tickets)
     return tickets
 
 
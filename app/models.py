@@ -9,6 +9,7 @@ from datetime import datetime
 from typing import Optional, List
 from enum import Enum
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 
 # --- 1. Enums ---
 # Enums restrict data to specific values. This prevents "typo" bugs in your data.
@@ -45,6 +46,9 @@ class Product(SQLModel, table=True):
     category: str
 
 class Order(SQLModel, table=True):
+    # Composite index for "this customer's latest orders" (WHERE customer_id ORDER BY order_date)
+    __table_args__ = (Index("ix_order_customer_id_order_date", "customer_id", "order_date"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     # Foreign Keys link tables together
     customer_id: int = Field(foreign_key="customer.id")
@@ -61,10 +65,17 @@ class RefundTicket(SQLModel, table=True):
     This table acts as our 'State Machine' for Human-in-the-Loop.
     When the Agent hits a threshold, it creates a row here instead of refunding money.
     """
+    __table_args__ = (
+        # Covers "latest ticket for this customer's order" (WHERE customer_id, order_id ORDER BY created_at)
+        Index("ix_refundticket_customer_order_created", "customer_id", "order_id", "created_at"),
+        # Covers "all of this customer's tickets, newest first" (WHERE customer_id ORDER BY created_at)
+        Index("ix_refundticket_customer_created", "customer_id", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     customer_id: int = Field(foreign_key="customer.id")
-    order_id: int = Field(foreign_key="order.id")
+    order_id: int = Field(foreign_key="order.id", index=True)
     amount: float
     reason: str
-    status: TicketStatus = Field(default=TicketStatus.OPEN)
+    status: TicketStatus = Field(default=TicketStatus.OPEN, index=True) # Admin dashboard filters on this
     created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
@@ -1,6 +1,7 @@
 # app/utils/db.py
 
 from sqlmodel import create_engine, Session
+from sqlalchemy import event
 
 import os
 
@@ -10,7 +11,25 @@ sqlite_file_name = os.path.join(BASE_DIR, "database.db")
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
 # check_same_thread=False is only needed for SQLite. It's not needed for other databases.
-engine = create_engine(sqlite_url, connect_args={"check_same_thread": False})
+engine = create_engine(
+    sqlite_url,
+    connect_args={"check_same_thread": False},
+    pool_size=10, # Connections kept open and reused across requests
+    max_overflow=20, # Extra connections allowed under burst load
+    pool_pre_ping=True,
+)
+
+# SQLite settings are per-connection, so apply them every time the pool opens one
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL") # Readers don't block the writer (and vice versa)
+    cursor.execute("PRAGMA synchronous=NORMAL") # Safe with WAL, far fewer fsyncs per commit
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456") # 256 MB memory-mapped reads
+    cursor.execute("PRAGMA cache_size=-65536") # 64 MB page cache (negative = KB)
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
 
 def get_session():
     # Dependency to yield a database session
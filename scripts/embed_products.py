@@ -1,9 +1,14 @@
+import asyncio
 import os
 import sys
+import numpy as np
 from dotenv import load_dotenv
 from google import genai
 from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance
+from qdrant_client.models import (
+    PointStruct, VectorParams, Distance, HnswConfigDiff,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType
+)
 from sqlmodel import Session, select
 
 # --- PATH SETUP ---
@@ -25,10 +30,13 @@ if not API_KEY:
 # NEW SDK INITIALIZATION
 client = genai.Client(api_key=API_KEY)
 
-# Initialize Qdrant (Local)
-qdrant_path = os.path.join(project_root, "qdrant_data")
-qdrant = QdrantClient(path=qdrant_path)
+# Initialize Qdrant (Server, over gRPC)
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+qdrant = QdrantClient(url=QDRANT_URL, prefer_grpc=True, grpc_port=6334)
 COLLECTION_NAME = "shop_products"
+BATCH = 100 # Products per embed_content call
+MAX_CONCURRENT_BATCHES = 8 # Embedding requests in flight at once
+UPSERT_BATCH = 64 # Points per upsert request, keeps each gRPC message small
 
 # Reset Collection
 if qdrant.collection_exists(COLLECTION_NAME):
@@ -37,45 +45,85 @@ if qdrant.collection_exists(COLLECTION_NAME):
 qdrant.create_collection(
     collection_name=COLLECTION_NAME,
     vectors_config=VectorParams(size=768, distance=Distance.COSINE),
+    # More graph links per node (default m=16) = better recall for a bit more memory
+    hnsw_config=HnswConfigDiff(m=24, ef_construct=128),
+    # Keep an int8 copy of every vector in RAM (4x smaller than float32) for the fast scan.
+    # The original float32 vectors are still stored and used to rescore the top results.
+    quantization_config=ScalarQuantization(
+        scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+    ),
 )
 
-def main():
+def build_point(product, embedding):
+    # Unit-length float32: cosine then is a plain dot product, and the collection's
+    # int8 quantization (above) takes care of the compact storage on the server
+    arr = np.asarray(embedding, dtype=np.float32)
+    arr /= np.linalg.norm(arr)
+    return PointStruct(
+        id=product.id,
+        vector=arr.tolist(),
+        payload={
+            "name": product.name,
+            "price": product.price,
+            "category": product.category,
+            "description": product.description
+        }
+    )
+
+async def embed_batch(sem, batch_products, batch_texts):
+    """Embed one batch of products, returning their points."""
+    async with sem:
+        try:
+            response = await client.aio.models.embed_content(
+                model="text-embedding-004",
+                contents=batch_texts
+            )
+            # One embedding per input text, in the same order.
+            # A short response would make zip() silently drop products, so retry those one by one.
+            if len(response.embeddings) != len(batch_texts):
+                raise ValueError(f"got {len(response.embeddings)} embeddings for {len(batch_texts)} products")
+            print(f"   🔹 Embedded batch of {len(batch_products)} products")
+            return [build_point(product, emb.values) for product, emb in zip(batch_products, response.embeddings)]
+
+        except Exception as e:
+            # Fall back to one call per product so a single bad item doesn't sink the batch
+            print(f"   ⚠️ Batch failed ({e}), retrying one by one")
+            points = []
+            for product, text in zip(batch_products, batch_texts):
+                try:
+                    response = await client.aio.models.embed_content(
+                        model="text-embedding-004",
+                        contents=text
+                    )
+                    points.append(build_point(product, response.embeddings[0].values))
+                    print(f"   🔹 Embedded: {product.name}")
+                except Exception as e:
+                    print(f"   ❌ Failed {product.name}: {e}")
+            return points
+
+async def main():
     print(f"--- 🧠 Semantic Indexing (Powered by google-genai SDK) ---")
     
     with Session(engine) as session:
         products = session.exec(select(Product)).all()
-        points = []
+        texts = [
+            f"Product: {p.name}. Category: {p.category}. Description: {p.description}"
+            for p in products
+        ]
         
-        for product in products:
-            text_to_embed = f"Product: {product.name}. Category: {product.category}. Description: {product.description}"
-            
-            try:
-                # --- NEW SDK CALL ---
-                response = client.models.embed_content(
-                    model="text-embedding-004",
-                    contents=text_to_embed
-                )
-                # The new SDK returns an object, we access .embeddings[0].values
-                embedding = response.embeddings[0].values
-                
-                points.append(PointStruct(
-                    id=product.id,
-                    vector=embedding,
-                    payload={
-                        "name": product.name,
-                        "price": product.price,
-                        "category": product.category,
-                        "description": product.description
-                    }
-                ))
-                print(f"   🔹 Embedded: {product.name}")
-                
-            except Exception as e:
-                print(f"   ❌ Failed {product.name}: {e}")
+        # Embed in batches: one API round-trip per BATCH products instead of one per product,
+        # with up to MAX_CONCURRENT_BATCHES batches in flight at the same time
+        sem = asyncio.Semaphore(MAX_CONCURRENT_BATCHES)
+        results = await asyncio.gather(*(
+            embed_batch(sem, products[start:start + BATCH], texts[start:start + BATCH])
+            for start in range(0, len(products), BATCH)
+        ))
+        points = [point for batch_points in results for point in batch_points]
 
         if points:
-            qdrant.upsert(collection_name=COLLECTION_NAME, points=points)
+            for start in range(0, len(points), UPSERT_BATCH):
+                qdrant.upsert(collection_name=COLLECTION_NAME, points=points[start:start + UPSERT_BATCH])
             print(f"✅ Indexed {len(points)} products.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -40,7 +40,7 @@ if __name__ == "__main__":
             if user_input.lower() in ["quit", "exit"]:
                 break
             
-            deps = SupportDeps(user_id=customer.id, db=session)
+            deps = SupportDeps(user_id=customer.id, db=session, customer=customer)
             try:
                 # Synchronous run for CLI testing
                 result = agent.run_sync(user_input, deps=deps)